@@ -2,139 +2,379 @@
 This script serves the Android project zip file for download
 """
 
+import collections
+import gzip
+import mmap
 import os
+import selectors
+import signal
+import socket
 import sys
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 import webbrowser
 from urllib.parse import quote
 
 PORT = 8000
 ZIP_FILE = "accounting-android-project.zip"
 
+# Landing page, pre-encoded once; the zip size is filled in with bytes %-formatting
+INDEX_TEMPLATE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>دانلود پروژه اندروید</title>
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            background-color: #121212;
+            color: #ffffff;
+            display: flex;
+            justify-content: center;
+            align-items: center;
+            height: 100vh;
+            margin: 0;
+            direction: rtl;
+        }
+        .container {
+            text-align: center;
+            background-color: #1e1e1e;
+            padding: 2rem;
+            border-radius: 8px;
+            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+            max-width: 500px;
+            width: 100%%;
+        }
+        h1 {
+            color: #0eead9;
+            margin-bottom: 1rem;
+        }
+        p {
+            margin-bottom: 1.5rem;
+            font-size: 1.1rem;
+            line-height: 1.5;
+        }
+        .download-btn {
+            background-color: #0eead9;
+            color: #121212;
+            border: none;
+            padding: 0.8rem 1.5rem;
+            font-size: 1.2rem;
+            font-weight: bold;
+            border-radius: 4px;
+            cursor: pointer;
+            text-decoration: none;
+            display: inline-block;
+            transition: background-color 0.3s;
+        }
+        .download-btn:hover {
+            background-color: #0ac2b2;
+        }
+        .file-info {
+            margin-top: 1rem;
+            font-size: 0.9rem;
+            color: #bbbbbb;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>دانلود پروژه اندروید اپلیکیشن حسابداری</h1>
+        <p>
+            فایل پروژه اندروید برای ساخت APK آماده دانلود است. پس از دانلود، فایل را استخراج کرده و طبق راهنمای
+            <code>ANDROID_BUILD_INSTRUCTIONS.md</code> برای ساخت فایل APK اقدام کنید.
+        </p>
+        <a href="/download" class="download-btn">دانلود فایل پروژه اندروید</a>
+        <p class="file-info">
+            حجم فایل: %.1f کیلوبایت
+        </p>
+    </div>
+</body>
+</html>
+""".encode("utf-8")
+
+# Everything served for one version of the zip, swapped as a unit when it changes
+ZipCache = collections.namedtuple("ZipCache", "stamp file mm size index_html index_html_gz")
+
+def load_zip():
+    """Open and memory-map the zip file and render the landing page for it"""
+    try:
+        f = open(ZIP_FILE, "rb")
+    except OSError:
+        return None
+    
+    st = os.fstat(f.fileno())
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Empty files cannot be mapped
+        mm = None
+    else:
+        if hasattr(mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+    
+    index_html = INDEX_TEMPLATE % (st.st_size / 1024.0,)
+    return ZipCache((st.st_mtime_ns, st.st_size), f, mm, st.st_size,
+                    index_html, gzip.compress(index_html, compresslevel=9))
+
+ZIP = load_zip()
+_zip_lock = threading.Lock()
+
+def current_zip():
+    """Return the cached zip, reloading it first if the file changed on disk"""
+    global ZIP
+    try:
+        st = os.stat(ZIP_FILE)
+    except OSError:
+        # Keep serving the copy we already have open
+        return ZIP
+    
+    stamp = (st.st_mtime_ns, st.st_size)
+    if ZIP is None or ZIP.stamp != stamp:
+        with _zip_lock:
+            if ZIP is None or ZIP.stamp != stamp:
+                ZIP = load_zip()
+    return ZIP
+
+class SendfileError(Exception):
+    """os.sendfile failed for a reason other than the client going away"""
+
+    def __init__(self, sent):
+        super().__init__(sent)
+        self.sent = sent
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows a gzip body (gzip;q=0 refuses it)"""
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() not in ("gzip", "x-gzip"):
+            continue
+        
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        return q > 0
+    return False
+
 class DownloadHandler(SimpleHTTPRequestHandler):
+    # Every response carries a Content-Length, so connections can be kept alive
+    protocol_version = "HTTP/1.1"
+    # Close idle keep-alive connections instead of parking a thread on them forever
+    timeout = 30
+    # Buffer wfile so headers and a small body go out in one send()
+    wbufsize = -1
+    
+    def setup(self):
+        super().setup()
+        # Don't let Nagle hold back small responses; give the zip a larger send window
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+    
     def do_GET(self):
-        if self.path == "/":
-            # HTML page with download link
-            self.send_response(200)
-            self.send_header("Content-type", "text/html")
-            self.end_headers()
-            
-            html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <title>دانلود پروژه اندروید</title>
-                <style>
-                    body {{
-                        font-family: Arial, sans-serif;
-                        background-color: #121212;
-                        color: #ffffff;
-                        display: flex;
-                        justify-content: center;
-                        align-items: center;
-                        height: 100vh;
-                        margin: 0;
-                        direction: rtl;
-                    }}
-                    .container {{
-                        text-align: center;
-                        background-color: #1e1e1e;
-                        padding: 2rem;
-                        border-radius: 8px;
-                        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-                        max-width: 500px;
-                        width: 100%;
-                    }}
-                    h1 {{
-                        color: #0eead9;
-                        margin-bottom: 1rem;
-                    }}
-                    p {{
-                        margin-bottom: 1.5rem;
-                        font-size: 1.1rem;
-                        line-height: 1.5;
-                    }}
-                    .download-btn {{
-                        background-color: #0eead9;
-                        color: #121212;
-                        border: none;
-                        padding: 0.8rem 1.5rem;
-                        font-size: 1.2rem;
-                        font-weight: bold;
-                        border-radius: 4px;
-                        cursor: pointer;
-                        text-decoration: none;
-                        display: inline-block;
-                        transition: background-color 0.3s;
-                    }}
-                    .download-btn:hover {{
-                        background-color: #0ac2b2;
-                    }}
-                    .file-info {{
-                        margin-top: 1rem;
-                        font-size: 0.9rem;
-                        color: #bbbbbb;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <h1>دانلود پروژه اندروید اپلیکیشن حسابداری</h1>
-                    <p>
-                        فایل پروژه اندروید برای ساخت APK آماده دانلود است. پس از دانلود، فایل را استخراج کرده و طبق راهنمای
-                        <code>ANDROID_BUILD_INSTRUCTIONS.md</code> برای ساخت فایل APK اقدام کنید.
-                    </p>
-                    <a href="/download" class="download-btn">دانلود فایل پروژه اندروید</a>
-                    <p class="file-info">
-                        حجم فایل: {os.path.getsize(ZIP_FILE) / 1024:.1f} کیلوبایت
-                    </p>
-                </div>
-            </body>
-            </html>
-            """
-            self.wfile.write(html.encode())
-            
-        elif self.path == "/download":
-            # Serve the zip file for download
-            if os.path.exists(ZIP_FILE):
-                self.send_response(200)
-                self.send_header("Content-type", "application/zip")
-                self.send_header("Content-Disposition", f"attachment; filename={quote(ZIP_FILE)}")
-                self.end_headers()
-                
-                with open(ZIP_FILE, "rb") as f:
-                    self.wfile.write(f.read())
+        if self.path not in ("/", "/download"):
+            # Serve 404 for any other paths
+            self.send_page(404, b"404 - Page not found")
+            return
+        
+        cache = current_zip()
+        if cache is None:
+            self.send_page(404, b"404 - File not found")
+        elif self.path == "/":
+            # HTML page with download link, pre-compressed for clients that accept gzip
+            if accepts_gzip(self.headers.get("Accept-Encoding", "")):
+                self.send_page(200, cache.index_html_gz, {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
             else:
-                self.send_response(404)
-                self.send_header("Content-type", "text/html")
-                self.end_headers()
-                self.wfile.write(b"404 - File not found")
+                self.send_page(200, cache.index_html, {"Vary": "Accept-Encoding"})
         else:
-            # Serve 404 for any other paths
-            self.send_response(404)
-            self.send_header("Content-type", "text/html")
+            # Serve the zip file for download
+            self.send_response(200)
+            self.send_header("Content-type", "application/zip")
+            self.send_header("Content-Disposition", f"attachment; filename={quote(ZIP_FILE)}")
+            self.send_header("Content-Length", str(cache.size))
             self.end_headers()
-            self.wfile.write(b"404 - Page not found")
+            
+            self.send_zip(cache)
+
+    def send_page(self, code, body, headers=None):
+        """Send a small HTML response with an explicit Content-Length"""
+        self.send_response(code)
+        self.send_header("Content-type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_zip(self, cache):
+        """Send the zip file to the client, letting the kernel copy it where possible"""
+        # Headers are still sitting in the wfile buffer; the body bypasses it
+        self.wfile.flush()
+        
+        sent = 0
+        fallback = True
+        if hasattr(os, "sendfile") and isinstance(self.connection, socket.socket):
+            try:
+                sent = self.sendfile_zip(cache)
+                fallback = False
+            except SendfileError as e:
+                # sendfile is not usable here; carry on from where it stopped
+                sent = e.sent
+        
+        if fallback and cache.mm is not None:
+            self.wfile.write(memoryview(cache.mm)[sent:])
+            sent = cache.size
+        elif fallback:
+            # Stream in bounded chunks rather than reading the whole file, never
+            # past the Content-Length already sent. A private file object keeps
+            # the seek away from the one shared by every handler thread.
+            with open(ZIP_FILE, "rb") as f:
+                f.seek(sent)
+                while sent < cache.size:
+                    chunk = f.read(min(cache.size - sent, 1 << 20))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+        
+        # The zip shrank mid-download; the client would otherwise keep waiting
+        # on this connection for bytes promised by Content-Length
+        if sent != cache.size:
+            self.close_connection = True
+
+    def sendfile_zip(self, cache):
+        """Copy the zip to the socket with os.sendfile and return the bytes sent
+
+        Every call passes an explicit offset, so the position of cache.file,
+        which all handler threads share, is never read or moved.
+        """
+        out_fd = self.connection.fileno()
+        in_fd = cache.file.fileno()
+        timeout = self.connection.gettimeout()
+        sent = 0
+        with selectors.DefaultSelector() as selector:
+            selector.register(out_fd, selectors.EVENT_WRITE)
+            while sent < cache.size:
+                try:
+                    count = os.sendfile(out_fd, in_fd, sent, cache.size - sent)
+                except BlockingIOError:
+                    # A socket with a timeout is non-blocking underneath
+                    if not selector.select(timeout):
+                        raise TimeoutError("timed out")
+                    continue
+                except (ConnectionError, TimeoutError):
+                    raise
+                except OSError as e:
+                    raise SendfileError(sent) from e
+                if count == 0:
+                    # End of file: the zip was truncated after it was opened
+                    break
+                sent += count
+        return sent
+
+class DownloadServer(ThreadingHTTPServer):
+    """Threaded HTTP server whose port can be shared by several processes"""
+
+    def __init__(self, server_address, handler_class, reuse_port=False):
+        self.reuse_port = reuse_port
+        super().__init__(server_address, handler_class)
+
+    def server_bind(self):
+        # Let each worker bind its own socket to PORT; the kernel balances accepts.
+        # Only when asked to, so a second copy of the script still fails to bind.
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
 
-def run_server():
+def worker_count():
+    """Number of server processes sharing PORT, from DOWNLOAD_WORKERS"""
+    value = os.environ.get("DOWNLOAD_WORKERS", "1")
+    try:
+        workers = int(value)
+    except ValueError:
+        workers = 0
+    if workers < 1:
+        print(f"Error: DOWNLOAD_WORKERS must be a positive integer, got {value!r}.")
+        sys.exit(1)
+    return workers
+
+def stop_server(signum, frame):
+    """Turn SIGTERM into a normal exit so the workers get cleaned up"""
+    sys.exit(0)
+
+def stop_workers(children):
+    """Terminate and reap the forked worker processes"""
+    if not children:
+        return
+    
+    # Don't let a second SIGTERM interrupt the cleanup
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+
+def run_server(workers=None):
     """Start the HTTP server to serve the download page"""
-    server_address = ('', PORT)
-    httpd = HTTPServer(server_address, DownloadHandler)
+    if workers is None:
+        workers = worker_count()
+    
+    # Fork extra workers before binding; they inherit the zip mapping.
+    # Sharing the port needs os.fork and SO_REUSEPORT, otherwise run one process.
+    reuse_port = workers > 1 and hasattr(os, "fork") and hasattr(socket, "SO_REUSEPORT")
+    is_parent = True
+    children = []
+    if reuse_port:
+        for _ in range(workers - 1):
+            pid = os.fork()
+            if pid == 0:
+                # Siblings forked earlier belong to the parent, not to this worker
+                is_parent = False
+                children = []
+                break
+            children.append(pid)
+    
+    if is_parent:
+        signal.signal(signal.SIGTERM, stop_server)
     
-    print(f"Starting download server at http://localhost:{PORT}")
-    print(f"Press Ctrl+C to stop the server.")
+    server_address = ('', PORT)
+    try:
+        httpd = DownloadServer(server_address, DownloadHandler, reuse_port)
+    except BaseException:
+        stop_workers(children)
+        raise
     
-    # Open the browser automatically if not running in Replit
-    if 'REPL_ID' not in os.environ:
-        webbrowser.open(f"http://localhost:{PORT}")
+    if is_parent:
+        print(f"Starting download server at http://localhost:{PORT}")
+        print(f"Press Ctrl+C to stop the server.")
+        
+        # Open the browser automatically if not running in Replit. The socket is
+        # already listening, so this runs in the background instead of delaying
+        # serve_forever()
+        if 'REPL_ID' not in os.environ:
+            threading.Thread(target=webbrowser.open, args=(f"http://localhost:{PORT}",),
+                             daemon=True).start()
     
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
-        print("\nServer stopped.")
+        if is_parent:
+            print("\nServer stopped.")
+    finally:
         httpd.server_close()
+        stop_workers(children)
 
 if __name__ == "__main__":
     if not os.path.exists(ZIP_FILE):
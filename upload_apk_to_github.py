@@ -4,38 +4,98 @@
 اسکریپت جامع برای ساخت و آپلود فایل APK به GitHub
 """
 
+import argparse
+import collections
+import contextlib
 import os
 import sys
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# مفسر فعلی پایتون برای اجرای اسکریپت‌های کمکی (بدون جستجو در PATH)
+PY = sys.executable
+
+APK_PATH = os.path.join("bin", "accountingapp-debug.apk")
+# فایل‌های APK کوچک‌تر از این اندازه احتمالاً ناقص هستند
+MIN_VALID_APK_BYTES = 10 * 1024
+# خروجی ساخت در پس‌زمینه به این فایل می‌رود تا با پرسش‌های ترمینال تداخل نکند
+BUILD_LOG = "apk_build.log"
+
 def print_header(title):
     """نمایش هدر زیبا برای عملیات"""
     width = 60
-    print("\n" + "=" * width)
-    print(title.center(width))
-    print("=" * width + "\n")
+    sys.stdout.write(f"\n{'=' * width}\n{title.center(width)}\n{'=' * width}\n\n")
+    sys.stdout.flush()
 
-def execute_command(command):
-    """اجرای یک دستور و نمایش خروجی آن"""
-    try:
-        result = subprocess.run(command, shell=True, check=True, text=True, 
-                              capture_output=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"❌ خطا در اجرای دستور: {e}")
-        print(f"خروجی خطا: {e.stderr}")
-        return None
+def print_lines(*lines):
+    """نمایش چند خط با یک بار نوشتن در خروجی"""
+    sys.stdout.write("".join(f"{line}\n" for line in lines))
+    sys.stdout.flush()
+
+def execute_command(argv, log_path=None):
+    """اجرای یک دستور و نمایش خروجی آن (یا نوشتن آن در log_path)"""
+    # خروجی به صورت زنده نمایش داده می‌شود و فقط خطوط آخر نگه داشته می‌شوند
+    tail = collections.deque(maxlen=64)
+    if log_path:
+        output = open(log_path, "w", encoding="utf-8")
+    else:
+        output = contextlib.nullcontext(sys.stdout)
+    # اسکریپت‌های کمکی پایتونی هستند و در لوله خروجی خود را بافر می‌کنند؛
+    # بدون بافر اجرا می‌شوند تا خطوط همان لحظه و به ترتیب درست برسند
+    env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+    with output as out, subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                         text=True, bufsize=1, env=env) as process:
+        for line in process.stdout:
+            out.write(line)
+            out.flush()
+            tail.append(line)
+        returncode = process.wait()
+        
+        if returncode != 0:
+            out.write(f"❌ خطا در اجرای دستور: {subprocess.list2cmdline(argv)} (کد خروج {returncode})\n")
+            return None
+    return "".join(tail).strip()
+
+def parse_args():
+    """خواندن آرگومان‌های خط فرمان"""
+    parser = argparse.ArgumentParser(description="ساخت و آپلود فایل APK به GitHub")
+    parser.add_argument("--token", help="توکن GitHub (به جای متغیر GITHUB_TOKEN)")
+    parser.add_argument("--repo", help="نام مخزن GitHub در قالب username/repo")
+    parser.add_argument("--force-rebuild", action="store_true",
+                        help="ساخت مجدد APK بدون پرسش، حتی اگر فایل موجود باشد")
+    return parser.parse_args()
+
+def apply_github_overrides(token=None, repo=None):
+    """اعمال توکن و نام مخزن داده‌شده در خط فرمان به جای متغیرهای محیطی"""
+    # مقدار داده‌شده در خط فرمان (حتی خالی) بر متغیر محیطی مقدم است
+    if token is not None:
+        if not token:
+            print("❌ توکن وارد نشده است. عملیات متوقف شد.")
+            return False
+        os.environ["GITHUB_TOKEN"] = token
+    
+    if repo is not None:
+        if "/" not in repo:
+            print("❌ نام مخزن نامعتبر است. عملیات متوقف شد.")
+            return False
+        os.environ["GITHUB_REPO"] = repo
+    return True
 
 def ensure_github_token():
     """اطمینان از تنظیم توکن GitHub"""
     if not os.environ.get("GITHUB_TOKEN"):
+        # بدون ترمینال تعاملی منتظر ورودی کاربر نمی‌مانیم
+        if not sys.stdin.isatty():
+            print("❌ توکن GitHub تنظیم نشده است. از --token یا متغیر GITHUB_TOKEN استفاده کنید.")
+            return False
+        
         print_header("تنظیم توکن GitHub")
-        print("توکن GitHub پیدا نشد. لطفاً توکن خود را وارد کنید:")
-        print("برای ایجاد توکن جدید، به آدرس زیر بروید:")
-        print("https://github.com/settings/tokens/new")
-        print("حداقل دسترسی‌های مورد نیاز: repo, workflow")
+        print_lines("توکن GitHub پیدا نشد. لطفاً توکن خود را وارد کنید:",
+                    "برای ایجاد توکن جدید، به آدرس زیر بروید:",
+                    "https://github.com/settings/tokens/new",
+                    "حداقل دسترسی‌های مورد نیاز: repo, workflow")
         
         token = input("\nتوکن GitHub را وارد کنید: ").strip()
         if token:
@@ -45,10 +105,10 @@ def ensure_github_token():
             # پیشنهاد ذخیره دائمی
             save = input("آیا مایل به ذخیره دائمی توکن هستید؟ (y/n): ").strip().lower()
             if save == 'y':
-                print("\nبرای ذخیره دائمی توکن در Replit:")
-                print("1. در سایدبار روی 🔒 Secrets کلیک کنید")
-                print("2. کلید: GITHUB_TOKEN")
-                print("3. مقدار: توکن شخصی گیت‌هاب که وارد کردید")
+                print_lines("\nبرای ذخیره دائمی توکن در Replit:",
+                            "1. در سایدبار روی 🔒 Secrets کلیک کنید",
+                            "2. کلید: GITHUB_TOKEN",
+                            "3. مقدار: توکن شخصی گیت‌هاب که وارد کردید")
                 input("\nبرای ادامه، کلید Enter را فشار دهید...")
             return True
         else:
@@ -58,7 +118,12 @@ def ensure_github_token():
 
 def ensure_github_repo():
     """اطمینان از تنظیم نام مخزن GitHub"""
-    if not os.environ.get("GITHUB_REPO") or os.environ.get("GITHUB_REPO") == "username/repo":
+    if not (repo := os.environ.get("GITHUB_REPO")) or repo == "username/repo":
+        # بدون ترمینال تعاملی منتظر ورودی کاربر نمی‌مانیم
+        if not sys.stdin.isatty():
+            print("❌ نام مخزن GitHub تنظیم نشده است. از --repo یا متغیر GITHUB_REPO استفاده کنید.")
+            return False
+        
         print_header("تنظیم مخزن GitHub")
         print("نام مخزن GitHub تنظیم نشده است. لطفاً نام مخزن را در قالب username/repo وارد کنید:")
         
@@ -70,10 +135,10 @@ def ensure_github_repo():
             # پیشنهاد ذخیره دائمی
             save = input("آیا مایل به ذخیره دائمی نام مخزن هستید؟ (y/n): ").strip().lower()
             if save == 'y':
-                print("\nبرای ذخیره دائمی نام مخزن در Replit:")
-                print("1. در سایدبار روی 🔒 Secrets کلیک کنید")
-                print("2. کلید: GITHUB_REPO")
-                print("3. مقدار: نام مخزن گیت‌هاب که وارد کردید")
+                print_lines("\nبرای ذخیره دائمی نام مخزن در Replit:",
+                            "1. در سایدبار روی 🔒 Secrets کلیک کنید",
+                            "2. کلید: GITHUB_REPO",
+                            "3. مقدار: نام مخزن گیت‌هاب که وارد کردید")
                 input("\nبرای ادامه، کلید Enter را فشار دهید...")
             return True
         else:
@@ -81,47 +146,60 @@ def ensure_github_repo():
             return False
     return True
 
-def create_apk():
-    """ساخت فایل APK نمونه"""
+def find_existing_apk(force_rebuild=False):
+    """بررسی فایل APK موجود؛ اگر باید از همان استفاده شود مسیر آن برگردانده می‌شود"""
     print_header("ساخت فایل APK")
     
+    # با --force-rebuild فایل موجود اهمیتی ندارد
+    if force_rebuild:
+        return None
+    
     # بررسی وجود APK
-    bin_dir = "bin"
-    apk_path = os.path.join(bin_dir, "accountingapp-debug.apk")
+    now = time.time()
+    apk_path = APK_PATH
     
-    if os.path.exists(apk_path):
-        file_age_minutes = (time.time() - os.path.getmtime(apk_path)) / 60
-        file_size_mb = os.path.getsize(apk_path) / (1024 * 1024)
+    try:
+        st = os.stat(apk_path)
+    except FileNotFoundError:
+        st = None
+    
+    if st is not None:
+        file_age_minutes = (now - st.st_mtime) / 60.0
+        file_size_mb = st.st_size / (1024 * 1024)
         
-        print(f"یک فایل APK موجود است:")
-        print(f"مسیر: {apk_path}")
-        print(f"اندازه: {file_size_mb:.2f} MB")
-        print(f"تاریخ ایجاد: {file_age_minutes:.1f} دقیقه پیش")
+        print_lines("یک فایل APK موجود است:",
+                    f"مسیر: {apk_path}",
+                    f"اندازه: {file_size_mb:.2f} MB",
+                    f"تاریخ ایجاد: {file_age_minutes:.1f} دقیقه پیش")
         
-        if file_size_mb < 0.01:  # کمتر از 10 کیلوبایت
+        if st.st_size < MIN_VALID_APK_BYTES:
             print("⚠️ هشدار: اندازه فایل موجود خیلی کوچک است و ممکن است نامعتبر باشد.")
         
+        # در اجرای غیرتعاملی از فایل موجود استفاده می‌شود
+        if not sys.stdin.isatty():
+            return apk_path
+        
         rebuild = input("آیا مایل به ساخت مجدد فایل APK هستید؟ (y/n): ").strip().lower()
         if rebuild != 'y':
             return apk_path
     
-    # ساخت APK جدید
-    print("در حال ساخت فایل APK جدید...")
-    result = execute_command("python create_apk.py")
-    
-    if result and os.path.exists(apk_path):
-        print("✅ فایل APK با موفقیت ساخته شد.")
-        return apk_path
-    else:
-        print("❌ خطا در ساخت فایل APK.")
-        return None
+    return None
+
+def build_apk(log_path=None):
+    """ساخت فایل APK جدید؛ در صورت موفقیت مسیر فایل برگردانده می‌شود"""
+    result = execute_command([PY, "create_apk.py"], log_path)
+    if result and os.path.exists(APK_PATH):
+        return APK_PATH
+    return None
 
 def upload_to_github(apk_path):
     """آپلود فایل APK به GitHub"""
     print_header("آپلود به GitHub")
     
     # بررسی مجدد وجود فایل
-    if not os.path.exists(apk_path):
+    try:
+        st = os.stat(apk_path)
+    except FileNotFoundError:
         print(f"❌ خطا: فایل APK در مسیر {apk_path} یافت نشد.")
         return False
     
@@ -130,19 +208,21 @@ def upload_to_github(apk_path):
         return False
     
     # نمایش اطلاعات فایل
-    file_size_mb = os.path.getsize(apk_path) / (1024 * 1024)
-    print(f"فایل APK: {apk_path}")
-    print(f"اندازه فایل APK: {file_size_mb:.2f} MB")
-    print(f"مخزن: {os.environ.get('GITHUB_REPO')}")
+    file_size_mb = st.st_size / (1024 * 1024)
+    repo = os.environ.get("GITHUB_REPO")
     
     # ایجاد نام تگ منحصر به فرد
     version = datetime.now().strftime("v%Y.%m.%d-%H%M%S")
     os.environ["RELEASE_VERSION"] = version
-    print(f"نسخه انتشار: {version}")
+    
+    print_lines(f"فایل APK: {apk_path}",
+                f"اندازه فایل APK: {file_size_mb:.2f} MB",
+                f"مخزن: {repo}",
+                f"نسخه انتشار: {version}",
+                "\n📤 در حال آپلود به GitHub...")
     
     # اجرای دستور آپلود
-    print("\n📤 در حال آپلود به GitHub...")
-    result = execute_command(f"python github_upload.py {apk_path}")
+    result = execute_command([PY, "github_upload.py", apk_path])
     
     if result and "آپلود با موفقیت انجام شد" in result:
         return True
@@ -150,27 +230,60 @@ def upload_to_github(apk_path):
         print("❌ خطا در آپلود به GitHub.")
         return False
 
+def print_failure():
+    """نمایش پیام شکست عملیات"""
+    print_header("عملیات ناموفق بود")
+    print_lines("❌ آپلود فایل APK به GitHub با مشکل مواجه شد.",
+                "لطفاً پیام‌های خطا را بررسی کنید و دوباره تلاش نمایید.")
+
 def main():
     """تابع اصلی برنامه"""
+    args = parse_args()
     print_header("فرآیند ساخت و آپلود APK به GitHub")
     
-    # ساخت فایل APK
-    apk_path = create_apk()
+    # بررسی‌هایی که به ورودی کاربر نیاز ندارند پیش از شروع ساخت انجام می‌شوند
+    # تا در صورت شکست، منتظر ساخت طولانی APK نمانیم
+    ready = apply_github_overrides(args.token, args.repo)
+    if ready and not sys.stdin.isatty():
+        ready = ensure_github_token() and ensure_github_repo()
+    if not ready:
+        print_failure()
+        sys.exit(1)
+    
+    apk_path = find_existing_apk(args.force_rebuild)
+    
+    # ساخت APK در پس‌زمینه، همزمان با پرسش توکن و نام مخزن از کاربر
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        build = None
+        if apk_path is None:
+            print_lines("در حال ساخت فایل APK جدید...",
+                        f"خروجی ساخت در فایل {BUILD_LOG} ذخیره می‌شود.")
+            build = executor.submit(build_apk, BUILD_LOG)
+        
+        ready = ensure_github_token() and ensure_github_repo()
+        
+        if build is not None:
+            apk_path = build.result()
+            if apk_path:
+                print("✅ فایل APK با موفقیت ساخته شد.")
+            else:
+                print(f"❌ خطا در ساخت فایل APK. جزئیات در فایل {BUILD_LOG}")
+    
     if not apk_path:
-        return
+        sys.exit(1)
     
     # آپلود به GitHub
-    upload_result = upload_to_github(apk_path)
+    upload_result = ready and upload_to_github(apk_path)
     
     if upload_result:
         print_header("عملیات با موفقیت انجام شد")
-        print("✅ فایل APK با موفقیت به GitHub آپلود شد.")
-        print(f"نسخه انتشار: {os.environ.get('RELEASE_VERSION', 'نامشخص')}")
-        print(f"مخزن: {os.environ.get('GITHUB_REPO', 'نامشخص')}")
+        print_lines("✅ فایل APK با موفقیت به GitHub آپلود شد.",
+                    f"نسخه انتشار: {os.environ.get('RELEASE_VERSION', 'نامشخص')}",
+                    f"مخزن: {os.environ.get('GITHUB_REPO', 'نامشخص')}")
     else:
-        print_header("عملیات ناموفق بود")
-        print("❌ آپلود فایل APK به GitHub با مشکل مواجه شد.")
-        print("لطفاً پیام‌های خطا را بررسی کنید و دوباره تلاش نمایید.")
+        print_failure()
+        # کد خروج غیرصفر تا اجرای خودکار (CI) شکست را تشخیص دهد
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()python upload_apk_to_github.py
+    main()